@@ -17,8 +17,8 @@ def main():
     config = load_config()
     logger.info(f"配置加载完成: {config}")
     
-    # 创建并启动Gradio应用
-    app = create_app()
+    # 创建并启动Gradio应用（ASR模型在后台预加载）
+    app = create_app(preload_models=True)
     app.launch(
         server_name="0.0.0.0",
         server_port=7860,
@@ -4,12 +4,29 @@ ASR引擎模块
 """
 
 from typing import Optional, Dict, Any, List
+import threading
+import time
 import numpy as np
 from funasr import AutoModel
 from soundmem.utils.logger import log
-import tempfile
-import os
-import soundfile as sf
+
+# numba为可选依赖：可用时对长音频的int16转换使用并行SIMD循环
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+# 样本数超过该值（约1分钟16kHz音频）才使用numba，短音频的线程调度开销反而更大
+_NUMBA_MIN_SAMPLES = 16000 * 60
+
+if _HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _int16_to_f32_kernel(buf_i16, out_f32):
+        """并行将int16样本缩放为float32"""
+        scale = np.float32(1.0 / 32768.0)
+        for i in prange(buf_i16.size):
+            out_f32[i] = buf_i16[i] * scale
 
 class ASREngine:
     """ASR语音识别引擎"""
@@ -28,26 +45,107 @@ class ASREngine:
         self.use_punc = use_punc
         self.model = None
         
+        # 模型可在后台线程预加载：_loading 在发起加载时（启动线程之前）置位，加载失败时清除；
+        # _loaded 在加载成功后置位；_load_lock 防止重复加载
+        self._loading = threading.Event()
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        
+        # 流式识别状态：默认在多次transcribe_realtime调用间复用，保持编码器上下文
+        self._stream_cache: Dict[str, Any] = {}
+        
+        # generate()的固定参数只构建一次，热词通过set_hotwords()更新
+        self._gen_kwargs: Dict[str, Any] = dict(batch_size_s=300, hotword="")
+        # 流式参数：chunk_size单位60ms，[0, 10, 5] 即每次解码600ms，前瞻300ms
+        self._stream_kwargs: Dict[str, Any] = dict(
+            chunk_size=[0, 10, 5],
+            encoder_chunk_look_back=4,  # 编码器自注意力回看的块数
+            decoder_chunk_look_back=1,  # 解码器交叉注意力回看的编码器块数
+            batch_size_s=300
+        )
+        
+        # int16转float32时复用的输出缓冲区，避免每次调用分配新数组
+        self._f32_buf = np.empty(0, dtype=np.float32)
+        
         log.info(f"初始化ASR引擎: model={model_name}, vad={use_vad}, punc={use_punc}")
     
-    def load_model(self):
-        """加载模型"""
+    def preload(self):
+        """在后台线程加载模型，返回前即标记为加载中，随后的识别调用会等待加载完成"""
+        self._loading.set()
+        threading.Thread(target=self._preload_worker, daemon=True).start()
+    
+    def _preload_worker(self):
+        """后台加载线程，失败已在load_model()中记录日志"""
         try:
-            log.info("正在加载ASR模型...")
-            
-            # 加载模型 - FunASR会自动处理VAD分段和标点恢复
-            self.model = AutoModel(
-                model=self.model_name,
-                vad_model="fsmn-vad" if self.use_vad else None,
-                punc_model="ct-punc" if self.use_punc else None,
-                device="cpu"
-            )
+            self.load_model()
+        except Exception:
+            pass
+    
+    def load_model(self):
+        """加载模型（可重复调用，已加载或正在加载时不会重复加载）"""
+        self._loading.set()
+        with self._load_lock:
+            if self._loaded.is_set():
+                return
             
-            log.info("ASR模型加载完成（包含VAD和标点恢复）")
+            try:
+                log.info("正在加载ASR模型...")
+                
+                # 加载模型 - FunASR会自动处理VAD分段和标点恢复
+                self.model = AutoModel(
+                    model=self.model_name,
+                    vad_model="fsmn-vad" if self.use_vad else None,
+                    punc_model="ct-punc" if self.use_punc else None,
+                    device="cpu",
+                    disable_update=True,  # 跳过启动时的版本检查网络请求
+                    disable_pbar=True
+                )
+                
+                self._loaded.set()
+                log.info("ASR模型加载完成（包含VAD和标点恢复）")
+                
+            except Exception as e:
+                self._loading.clear()
+                log.error(f"加载ASR模型失败: {e}")
+                raise
+    
+    def _wait_until_loaded(self, timeout: float = 300.0):
+        """
+        等待模型加载完成
+        
+        Args:
+            timeout: 最长等待时间(秒)
+        """
+        # 从未发起加载（或加载已失败）时立即报错，不必等待
+        deadline = time.monotonic() + timeout
+        while not self._loaded.is_set():
+            if not self._loading.is_set():
+                raise RuntimeError("模型未加载，请先调用load_model()")
+            # 定期醒来检查加载是否已失败
+            if self._loaded.wait(0.5):
+                break
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"等待ASR模型加载超时（{timeout:.0f}秒）")
+    
+    def _int16_to_float32(self, audio_data: np.ndarray) -> np.ndarray:
+        """
+        将int16音频一次性缩放为[-1, 1)范围的float32
+        
+        Args:
+            audio_data: 一维int16音频数据
             
-        except Exception as e:
-            log.error(f"加载ASR模型失败: {e}")
-            raise
+        Returns:
+            指向复用缓冲区的float32视图（下次调用时会被覆盖）
+        """
+        n = audio_data.size
+        if self._f32_buf.size < n:
+            self._f32_buf = np.empty(n, dtype=np.float32)
+        out = self._f32_buf[:n]
+        if _HAS_NUMBA and n >= _NUMBA_MIN_SAMPLES:
+            _int16_to_f32_kernel(np.ascontiguousarray(audio_data), out)
+        else:
+            np.multiply(audio_data, np.float32(1.0 / 32768.0), out=out, dtype=np.float32)
+        return out
     
     def transcribe(self, audio_data: np.ndarray, sample_rate: int = 16000) -> Dict[str, Any]:
         """
@@ -60,9 +158,6 @@ class ASREngine:
         Returns:
             转写结果字典，包含多个分段结果
         """
-        if self.model is None:
-            raise RuntimeError("模型未加载，请先调用load_model()")
-        
         try:
             # 确保音频数据是一维的
             if len(audio_data.shape) > 1:
@@ -70,58 +165,78 @@ class ASREngine:
             
             # 确保音频数据是float32格式（FunASR要求）
             if audio_data.dtype == np.int16:
-                audio_data = audio_data.astype(np.float32) / 32767.0
+                audio_data = self._int16_to_float32(audio_data)
             elif audio_data.dtype != np.float32:
                 audio_data = audio_data.astype(np.float32)
             
-            # 保存为临时WAV文件（FunASR对文件输入处理更好）
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-                tmp_path = tmp_file.name
-                sf.write(tmp_path, audio_data, sample_rate)
+            audio_data = np.ascontiguousarray(audio_data)
+                
+        except Exception as e:
+            log.error(f"音频转写失败: {e}")
+            return {
+                "text": "",
+                "segments": [],
+                "success": False,
+                "error": str(e)
+            }
+        
+        return self.transcribe_mono_f32(audio_data, sample_rate)
+    
+    def transcribe_mono_f32(self, buf: np.ndarray, sample_rate: int = 16000) -> Dict[str, Any]:
+        """
+        转写音频的快速路径 - 跳过形状和类型检查
+        
+        调用方需保证输入为一维、C连续的float32数组（AudioRecorder单声道输出即满足）。
+        
+        Args:
+            buf: 一维float32音频数据
+            sample_rate: 采样率
+            
+        Returns:
+            转写结果字典，包含多个分段结果
+        """
+        if __debug__:
+            assert buf.ndim == 1 and buf.dtype == np.float32 and buf.flags['C_CONTIGUOUS'], \
+                "transcribe_mono_f32 需要一维C连续的float32数组"
+        
+        self._wait_until_loaded()
+        
+        try:
+            # 直接传入numpy数组，避免临时WAV文件的编码/解码往返
+            # 进行识别 - FunASR会自动使用VAD分段
+            result = self.model.generate(input=buf, fs=sample_rate, **self._gen_kwargs)
             
-            try:
-                # 进行识别 - FunASR会自动使用VAD分段
-                result = self.model.generate(
-                    input=tmp_path,
-                    batch_size_s=300,  # 批处理大小
-                    hotword=""
-                )
+            # 提取文本 - FunASR的VAD会返回多个分段
+            if result and len(result) > 0:
+                # 合并所有分段的文本
+                all_texts = []
+                segments = []
+                
+                for item in result:
+                    text = item.get("text", "")
+                    if text:
+                        all_texts.append(text)
+                        segments.append({
+                            "text": text,
+                            "start": item.get("start", 0),
+                            "end": item.get("end", 0)
+                        })
+                
+                combined_text = " ".join(all_texts)
                 
-                # 提取文本 - FunASR的VAD会返回多个分段
-                if result and len(result) > 0:
-                    # 合并所有分段的文本
-                    all_texts = []
-                    segments = []
-                    
-                    for item in result:
-                        text = item.get("text", "")
-                        if text:
-                            all_texts.append(text)
-                            segments.append({
-                                "text": text,
-                                "start": item.get("start", 0),
-                                "end": item.get("end", 0)
-                            })
-                    
-                    combined_text = " ".join(all_texts)
-                    
-                    return {
-                        "text": combined_text,
-                        "segments": segments,  # 保留分段信息
-                        "success": True,
-                        "raw_result": result
-                    }
-                else:
-                    return {
-                        "text": "",
-                        "segments": [],
-                        "success": False,
-                        "error": "识别结果为空"
-                    }
-            finally:
-                # 删除临时文件
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
+                return {
+                    "text": combined_text,
+                    "segments": segments,  # 保留分段信息
+                    "success": True,
+                    "raw_result": result
+                }
+            else:
+                return {
+                    "text": "",
+                    "segments": [],
+                    "success": False,
+                    "error": "识别结果为空"
+                }
                 
         except Exception as e:
             log.error(f"音频转写失败: {e}")
@@ -140,13 +255,12 @@ class ASREngine:
         Args:
             audio_data: 音频数据
             sample_rate: 采样率
-            cache: 缓存字典，用于保持上下文
+            cache: 缓存字典，用于保持上下文；为None时使用引擎内部的流式缓存
             
         Returns:
             转写结果字典
         """
-        if self.model is None:
-            raise RuntimeError("模型未加载，请先调用load_model()")
+        self._wait_until_loaded()
         
         try:
             # 确保音频数据格式正确
@@ -154,19 +268,19 @@ class ASREngine:
                 audio_data = audio_data.flatten()
             
             if audio_data.dtype == np.int16:
-                audio_data = audio_data.astype(np.float32) / 32767.0
+                audio_data = self._int16_to_float32(audio_data)
             elif audio_data.dtype != np.float32:
                 audio_data = audio_data.astype(np.float32)
             
-            # 使用流式识别
+            # 使用流式识别，未传入cache时复用引擎状态，避免每次从头计算上下文
             if cache is None:
-                cache = {}
+                cache = self._stream_cache
             
             result = self.model.generate(
                 input=audio_data,
                 cache=cache,  # 保持上下文
                 is_final=False,  # 非最终结果
-                batch_size_s=300
+                **self._stream_kwargs
             )
             
             if result and len(result) > 0:
@@ -193,4 +307,17 @@ class ASREngine:
                 "error": str(e),
                 "cache": cache
             }
-
+    
+    def set_hotwords(self, hotwords: List[str]):
+        """
+        设置热词
+        
+        Args:
+            hotwords: 热词列表，为空时清除热词
+        """
+        self._gen_kwargs = dict(self._gen_kwargs, hotword=" ".join(hotwords))
+        log.info(f"ASR热词已更新: {len(hotwords)} 个")
+    
+    def reset_stream(self):
+        """重置流式识别上下文（在用户切分新段落时调用）"""
+        self._stream_cache.clear()
@@ -3,7 +3,6 @@
 实现实时音频采集功能
 """
 
-import queue
 import threading
 import time
 from typing import Optional, Callable
@@ -14,7 +13,8 @@ from soundmem.utils.logger import log
 class AudioRecorder:
     """音频录音器"""
     
-    def __init__(self, sample_rate: int = 16000, channels: int = 1, chunk_duration: int = 5):
+    def __init__(self, sample_rate: int = 16000, channels: int = 1, chunk_duration: int = 5,
+                 max_buffer_seconds: int = 30):
         """
         初始化录音器
         
@@ -22,27 +22,55 @@ class AudioRecorder:
             sample_rate: 采样率
             channels: 声道数
             chunk_duration: 音频块时长(秒)
+            max_buffer_seconds: 缓冲区最多保留的音频时长(秒)，超出时丢弃最旧的数据
         """
         self.sample_rate = sample_rate
         self.channels = channels
         self.chunk_duration = chunk_duration
         self.chunk_size = sample_rate * chunk_duration
+        self.max_buffer_seconds = max_buffer_seconds
+        
+        # 预分配的环形缓冲区，回调只做拷贝，不产生新的堆分配
+        # 容量固定为 max_buffer_seconds 秒，长时间录音时内存占用不会增长
+        # _write_idx/_read_idx 为累计帧数，单生产者单消费者，由GIL保证整数赋值的原子性
+        self._ring = np.empty((max_buffer_seconds * sample_rate, channels), dtype=np.float32)
+        # 回调直接按字节写入：memoryview切片赋值即一次memcpy，不经过numpy的调度开销
+        self._ring_bytes = memoryview(self._ring).cast('B')
+        self._capacity = len(self._ring)
+        self._frame_bytes = channels * self._ring.itemsize
+        # 溢出截断时额外留出的余量（帧），拷贝期间回调继续写入也不会覆盖正在读取的数据
+        self._overflow_margin = min(sample_rate, self._capacity // 2)
+        self._write_idx = 0
+        self._read_idx = 0
+        # 单生产者单消费者只需一个条件变量：消费者在缓冲区为空时等待，回调写入后唤醒
+        self._data_cond = threading.Condition()
+        # 回调中只记录流状态，日志由消费者线程输出，避免在实时线程中做I/O
+        self._stream_status = None
         
-        self.audio_queue = queue.Queue()
         self.is_recording = False
-        self.stream: Optional[sd.InputStream] = None
+        self.stream: Optional[sd.RawInputStream] = None
         self.record_thread: Optional[threading.Thread] = None
         
-        log.info(f"音频录音器初始化: 采样率={sample_rate}Hz, 声道={channels}, 块时长={chunk_duration}s")
+        log.info(f"音频录音器初始化: 采样率={sample_rate}Hz, 声道={channels}, 块时长={chunk_duration}s, "
+                 f"缓冲上限={max_buffer_seconds}s")
     
     def _audio_callback(self, indata, frames, time_info, status):
-        """音频回调函数"""
+        """音频回调函数（运行在实时音频线程，只做内存拷贝和唤醒）"""
         if status:
-            log.warning(f"音频流状态: {status}")
+            self._stream_status = status
         
-        # 将音频数据放入队列
-        audio_data = indata.copy()
-        self.audio_queue.put(audio_data)
+        # indata为驱动缓冲区，按字节直接拷入环形缓冲区
+        src = memoryview(indata).cast('B')
+        ring = self._ring_bytes
+        fb = self._frame_bytes
+        w = self._write_idx % self._capacity
+        first = min(frames, self._capacity - w)
+        ring[w * fb:(w + first) * fb] = src[:first * fb]
+        if first < frames:
+            ring[:(frames - first) * fb] = src[first * fb:frames * fb]
+        self._write_idx += frames
+        with self._data_cond:
+            self._data_cond.notify()
     
     def start_recording(self):
         """开始录音"""
@@ -51,13 +79,14 @@ class AudioRecorder:
             return
         
         self.is_recording = True
+        self.clear_queue()
         
         try:
             # 创建音频流
-            self.stream = sd.InputStream(
+            self.stream = sd.RawInputStream(
                 samplerate=self.sample_rate,
                 channels=self.channels,
-                dtype=np.float32,
+                dtype='float32',
                 callback=self._audio_callback,
                 blocksize=int(self.sample_rate * 0.1)  # 100ms块
             )
@@ -75,42 +104,70 @@ class AudioRecorder:
             log.warning("录音未在进行中")
             return
         
-        self.is_recording = False
-        
         if self.stream:
             self.stream.stop()
             self.stream.close()
             self.stream = None
         
+        # 流已停止后再置位并唤醒消费者，消费者取完剩余数据后收到None
+        with self._data_cond:
+            self.is_recording = False
+            self._data_cond.notify_all()
+        
         log.info("录音停止")
     
-    def get_audio_chunk(self, timeout: float = 1.0) -> Optional[np.ndarray]:
+    def get_audio_chunk(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
         """
-        获取音频块
+        获取音频块，缓冲区为空时阻塞等待
         
         Args:
-            timeout: 超时时间(秒)
+            timeout: 超时时间(秒)，None表示一直等待到有数据或录音停止
             
         Returns:
-            音频数据数组，如果超时返回None
+            音频数据数组（单声道时为一维C连续float32）；超时或录音已停止且数据取完时返回None
         """
-        try:
-            audio_data = self.audio_queue.get(timeout=timeout)
-            return audio_data
-        except queue.Empty:
-            return None
-    
-    def get_audio_stream(self) -> queue.Queue:
-        """获取音频流队列"""
-        return self.audio_queue
+        status = self._stream_status
+        if status:
+            self._stream_status = None
+            log.warning(f"音频流状态: {status}")
+        
+        if self._write_idx == self._read_idx:
+            with self._data_cond:
+                self._data_cond.wait_for(
+                    lambda: self._write_idx != self._read_idx or not self.is_recording, timeout
+                )
+            if self._write_idx == self._read_idx:
+                return None
+        
+        capacity = self._capacity
+        w = self._write_idx
+        r = self._read_idx
+        
+        # 消费者落后接近 max_buffer_seconds 时，最旧的数据已被或即将被回调覆盖，只保留最近的部分（FIFO截断）
+        # 截断位置留出余量，拷贝期间回调写入的新数据落在余量内
+        keep = capacity - self._overflow_margin
+        if w - r > keep:
+            log.warning(f"音频缓冲区溢出，丢弃 {w - r - keep} 帧")
+            r = w - keep
+        
+        start = r % capacity
+        end = start + (w - r)
+        if end <= capacity:
+            audio_data = self._ring[start:end].copy()
+        else:
+            # 跨越环形缓冲区末尾时拼接两段
+            audio_data = np.concatenate((self._ring[start:], self._ring[:end - capacity]))
+        
+        # 单声道时输出一维数组（连续内存上的reshape不产生拷贝），可直接走ASR快速路径
+        if self.channels == 1:
+            audio_data = audio_data.reshape(-1)
+        
+        self._read_idx = w
+        return audio_data
     
     def clear_queue(self):
-        """清空音频队列"""
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
+        """清空音频缓冲区"""
+        self._read_idx = self._write_idx
     
     @staticmethod
     def list_devices():
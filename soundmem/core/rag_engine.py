@@ -2,8 +2,10 @@
 RAG检索引擎模块
 """
 
-from typing import List, Dict, Any
-from openai import OpenAI
+import asyncio
+from typing import List, Dict, Any, AsyncIterator
+import httpx
+from openai import AsyncOpenAI
 from soundmem.core.vector_store import VectorStore
 from soundmem.utils.logger import log
 
@@ -23,12 +25,23 @@ class RAGEngine:
         self.vector_store = vector_store
         self.model_name = model_name
         
-        # 初始化OpenAI客户端
-        self.client = OpenAI(
+        # 复用同一个HTTP连接池，避免每次问答重新进行TCP/TLS握手
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=120)
+        )
+        
+        # 初始化OpenAI异步客户端
+        self.client = AsyncOpenAI(
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            http_client=self._http
         )
         
+        # 通义千问API需要通过extra_body控制enable_thinking，初始化时判断一次即可
+        # 使用客户端解析后的地址：base_url为None时客户端会回退到OPENAI_BASE_URL环境变量
+        self._is_qwen = "qwen" in model_name.lower() or "dashscope" in str(self.client.base_url).lower()
+        
         # 系统提示词
         self.system_prompt = """你是一个智能录音助手，专门帮助用户回答关于录音内容的问题。
 
@@ -43,40 +56,76 @@ class RAGEngine:
 - 只基于提供的录音内容回答，不要编造信息
 - 如果不确定，请说"根据录音内容，我无法确定..."
 """
+        self._system_message = {"role": "system", "content": self.system_prompt}
         
         log.info(f"RAG引擎初始化完成: model={model_name}")
     
-    def build_context(self, query: str, top_k: int = 5) -> tuple[str, List[Dict[str, Any]]]:
+    def build_context(self, query: str, top_k: int = 5, return_docs: bool = True) -> tuple[str, List[Dict[str, Any]]]:
         """
         构建上下文
         
         Args:
             query: 用户查询
             top_k: 检索数量
+            return_docs: 是否组装检索结果列表（不需要时可省去逐条构建字典）
             
         Returns:
             (上下文文本, 检索结果列表)
         """
-        # 从向量库检索相关文本
-        results = self.vector_store.search(query, top_k=top_k)
+        # 从向量库检索相关文本（按字段返回的并行数组）
+        soa = self.vector_store.search_soa(query, top_k=top_k)
+        texts = soa['texts']
         
-        if not results:
+        if not texts:
             return "暂无相关录音内容。", []
         
         # 构建上下文
-        context_parts = []
-        for i, result in enumerate(results, 1):
-            text = result['text']
-            metadata = result['metadata']
-            timestamp = metadata.get('timestamp', '未知时间')
-            
-            context_parts.append(f"[片段{i}] (时间: {timestamp})\n{text}")
+        context = "\n\n".join(
+            f"[片段{i}] (时间: {t})\n{x}"
+            for i, (t, x) in enumerate(zip(soa['timestamps'], texts), 1)
+        )
         
-        context = "\n\n".join(context_parts)
+        results = self.vector_store.to_results(soa) if return_docs else []
         
         return context, results
     
-    def query(self, question: str, top_k: int = 5, temperature: float = 0.7, max_tokens: int = 2000) -> Dict[str, Any]:
+    def _build_api_params(self, user_message: str, temperature: float, max_tokens: int, stream: bool) -> Dict[str, Any]:
+        """
+        构建API调用参数
+        
+        Args:
+            user_message: 用户消息
+            temperature: 温度参数
+            max_tokens: 最大token数
+            stream: 是否流式调用
+            
+        Returns:
+            chat.completions.create的参数字典
+        """
+        api_params = {
+            "model": self.model_name,
+            "messages": [
+                self._system_message,
+                {"role": "user", "content": user_message}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        
+        if stream:
+            api_params["stream"] = True
+        
+        # 通义千问API：非流式调用需要禁用enable_thinking，流式调用可以启用
+        if self._is_qwen:
+            api_params["extra_body"] = {"enable_thinking": stream}
+        
+        return api_params
+    
+    async def aclose(self):
+        """关闭HTTP连接池"""
+        await self._http.aclose()
+    
+    async def query(self, question: str, top_k: int = 5, temperature: float = 0.7, max_tokens: int = 2000) -> Dict[str, Any]:
         """
         查询问答
         
@@ -90,8 +139,8 @@ class RAGEngine:
             回答结果字典
         """
         try:
-            # 构建上下文
-            context, retrieved_docs = self.build_context(question, top_k)
+            # 构建上下文（向量检索是同步计算，放到线程中执行，不阻塞事件循环）
+            context, retrieved_docs = await asyncio.to_thread(self.build_context, question, top_k)
             
             # 构建用户消息
             user_message = f"""录音内容：
@@ -102,22 +151,9 @@ class RAGEngine:
 请基于上述录音内容回答用户的问题。"""
             
             # 调用LLM
-            # 构建API调用参数
-            api_params = {
-                "model": self.model_name,
-                "messages": [
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": temperature,
-                "max_tokens": max_tokens
-            }
-            
-            # 通义千问API需要禁用enable_thinking（非流式调用）
-            if "qwen" in self.model_name.lower() or "dashscope" in str(self.client.base_url).lower():
-                api_params["extra_body"] = {"enable_thinking": False}
+            api_params = self._build_api_params(user_message, temperature, max_tokens, stream=False)
             
-            response = self.client.chat.completions.create(**api_params)
+            response = await self.client.chat.completions.create(**api_params)
             
             answer = response.choices[0].message.content
             
@@ -140,7 +176,8 @@ class RAGEngine:
                 "error": str(e)
             }
     
-    def stream_query(self, question: str, top_k: int = 5, temperature: float = 0.7, max_tokens: int = 2000):
+    async def stream_query(self, question: str, top_k: int = 5, temperature: float = 0.7,
+                           max_tokens: int = 2000) -> AsyncIterator[str]:
         """
         流式查询问答
         
@@ -154,8 +191,8 @@ class RAGEngine:
             回答文本片段
         """
         try:
-            # 构建上下文
-            context, retrieved_docs = self.build_context(question, top_k)
+            # 构建上下文（向量检索是同步计算，放到线程中执行，不阻塞事件循环）
+            context, _ = await asyncio.to_thread(self.build_context, question, top_k, False)
             
             # 构建用户消息
             user_message = f"""录音内容：
@@ -166,25 +203,11 @@ class RAGEngine:
 请基于上述录音内容回答用户的问题。"""
             
             # 调用LLM流式接口
-            # 构建API调用参数
-            api_params = {
-                "model": self.model_name,
-                "messages": [
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "stream": True
-            }
-            
-            # 通义千问API的流式调用可以启用enable_thinking
-            if "qwen" in self.model_name.lower() or "dashscope" in str(self.client.base_url).lower():
-                api_params["extra_body"] = {"enable_thinking": True}
+            api_params = self._build_api_params(user_message, temperature, max_tokens, stream=True)
             
-            stream = self.client.chat.completions.create(**api_params)
+            stream = await self.client.chat.completions.create(**api_params)
             
-            for chunk in stream:
+            async for chunk in stream:
                 if chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
             
@@ -4,10 +4,43 @@
 """
 
 import re
-from typing import List, Dict, Any
+import string
+from collections import Counter
+from typing import List, Dict, Any, Iterator
 from datetime import datetime
 from soundmem.utils.logger import log
 
+# 归一化后为空文本时返回的占位符，避免空字符串产生零向量（余弦相似度为NaN）
+EMPTY_SENTINEL = "∅"
+
+# 中文数字到数值的映射
+_CN_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4,
+              '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_CN_UNITS = {'十': 10, '百': 100, '千': 1000}
+
+# 口语省略末位单位时（如"一万二"、"三千五"），末位数字对应的位值
+_CN_ABBREV_UNITS = {'百': 10, '千': 100, '万': 1000}
+
+# 两个相邻的非零数字（如"两三"、"五六"）表示约数或叠词，不能合并成一个数
+_CN_ADJACENT_DIGITS_RE = re.compile('[一二两三四五六七八九]{2}')
+
+def _cn_to_int(word: str) -> int:
+    """将中文数字（如"一百零五"、"两万三千"、"一万二"）解析为整数"""
+    total = section = num = 0
+    for char in word:
+        if char in _CN_DIGITS:
+            num = _CN_DIGITS[char]
+        elif char in _CN_UNITS:
+            section += (num or 1) * _CN_UNITS[char]
+            num = 0
+        else:  # 万
+            total += (section + num) * 10000
+            section = num = 0
+    # 末位数字紧跟在百/千/万之后时省略了下一级单位："一万二"=12000
+    if num and len(word) >= 2 and word[-2] in _CN_ABBREV_UNITS:
+        num *= _CN_ABBREV_UNITS[word[-2]]
+    return total + section + num
+
 class TextProcessor:
     """文本处理器"""
     
@@ -22,8 +55,21 @@ class TextProcessor:
         self.max_chunk_size = max_chunk_size
         self.min_chunk_size = min_chunk_size
         
-        # 句子结束标点
-        self.sentence_endings = ['。', '！', '？', '.', '!', '?', '\n']
+        # 句子结束标点（frozenset，成员判断为O(1)哈希查找）
+        self.sentence_endings = frozenset('。！？.!?\n')
+        
+        # 预编译正则：按句末标点切分（保留标点），末尾无标点的残句单独匹配
+        endings = ''.join(re.escape(c) for c in sorted(self.sentence_endings))
+        self._sent_re = re.compile(f'[^{endings}]*[{endings}]|[^{endings}]+$')
+        self._ws_re = re.compile(r'\s+')
+        # 关键词切分：每个汉字单独成词，英文/数字取长度≥2的连续串
+        self._word_re = re.compile(r'[\u4e00-\u9fff]|[A-Za-z0-9]{2,}')
+        
+        # 向量化前的归一化：口语填充词（"那个"只在后跟停顿时视为填充词）
+        self._filler_re = re.compile(r'(?:呃|嗯)[，,、。.]?|那个[，,、]')
+        # 至少两个字且以数字/十开头的中文数字串，避免误伤"万一"、"一个"等词
+        self._cn_num_re = re.compile(r'[零〇一二两三四五六七八九十][零〇一二两三四五六七八九十百千万]+')
+        self._ascii_lower = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
         
         log.info(f"文本处理器初始化: max_chunk={max_chunk_size}, min_chunk={min_chunk_size}")
     
@@ -41,41 +87,64 @@ class TextProcessor:
             return ""
         
         # 去除多余空格
-        text = re.sub(r'\s+', ' ', text)
+        text = self._ws_re.sub(' ', text)
         
         # 去除首尾空格
         text = text.strip()
         
         return text
     
-    def split_into_sentences(self, text: str) -> List[str]:
+    def normalize_for_embedding(self, text: str) -> str:
         """
-        将文本分割成句子
+        向量化前的文本归一化
+        
+        小写ASCII字母、去除口语填充词、将中文数字转为阿拉伯数字，
+        结果为空时返回占位符 EMPTY_SENTINEL。
         
         Args:
             text: 输入文本
             
         Returns:
-            句子列表
+            归一化后的文本
         """
-        if not text:
-            return []
-        
-        sentences = []
-        current_sentence = ""
+        text = text.translate(self._ascii_lower)
+        text = self._filler_re.sub('', text)
+        text = self._cn_num_re.sub(self._replace_cn_number, text)
+        text = self._ws_re.sub(' ', text).strip()
         
-        for char in text:
-            current_sentence += char
-            if char in self.sentence_endings:
-                if current_sentence.strip():
-                    sentences.append(current_sentence.strip())
-                current_sentence = ""
+        return text or EMPTY_SENTINEL
+    
+    @staticmethod
+    def _replace_cn_number(match: re.Match) -> str:
+        """中文数字串替换为阿拉伯数字"""
+        word = match.group()
+        # 不含单位的读法（如"二零二四"）逐位转换；两位的"五六"、"一一"和含"两"的是约数或叠词，保持原样
+        if not any(char in _CN_UNITS or char == '万' for char in word):
+            if len(word) < 3 or '两' in word:
+                return word
+            return ''.join(str(_CN_DIGITS[char]) for char in word)
+        # 含单位但有相邻数字（如"三四十"）是约数，保持原样
+        if _CN_ADJACENT_DIGITS_RE.search(word):
+            return word
+        return str(_cn_to_int(word))
+    
+    def split_into_sentences(self, text: str) -> Iterator[str]:
+        """
+        将文本分割成句子（逐句生成，不一次性构建句子列表）
         
-        # 添加最后一个句子
-        if current_sentence.strip():
-            sentences.append(current_sentence.strip())
+        Args:
+            text: 输入文本
+            
+        Yields:
+            句子
+        """
+        if not text:
+            return
         
-        return sentences
+        for match in self._sent_re.finditer(text):
+            sentence = match.group().strip()
+            if sentence:
+                yield sentence
     
     def chunk_text(self, text: str, timestamp: str = None) -> List[Dict[str, Any]]:
         """
@@ -86,53 +155,65 @@ class TextProcessor:
             timestamp: 时间戳
             
         Returns:
-            文本块列表
+            文本块列表，text为原文（入库和展示用），embedding_text为归一化后用于向量化的文本
         """
         if not text:
             return []
         
+        # 同一次ASR结果的所有块共用一个时间戳
+        ts = timestamp or datetime.now().isoformat()
+        
         # 清洗文本
         text = self.clean_text(text)
         
-        # 如果文本长度小于最大块大小，直接返回
+        # 如果文本长度小于最大块大小，不再切分
         if len(text) <= self.max_chunk_size:
-            return [{
-                "text": text,
-                "timestamp": timestamp or datetime.now().isoformat(),
-                "length": len(text)
-            }]
+            chunks = [{"text": text, "timestamp": ts}]
+        else:
+            chunks = self._pack_sentences(text, ts)
         
-        # 分割成句子
-        sentences = self.split_into_sentences(text)
+        # 归一化文本只用于向量化，原文保留；丢弃归一化后为空的块
+        for chunk in chunks:
+            chunk["embedding_text"] = self.normalize_for_embedding(chunk["text"])
+        chunks = [chunk for chunk in chunks if chunk["embedding_text"] != EMPTY_SENTINEL]
+        
+        log.info(f"文本分块完成: 原始长度={len(text)}, 块数={len(chunks)}")
+        
+        return chunks
+    
+    def _pack_sentences(self, text: str, ts: str) -> List[Dict[str, Any]]:
+        """
+        按句子将长文本打包成不超过max_chunk_size的块
         
+        Args:
+            text: 已清洗的文本
+            ts: 时间戳
+            
+        Returns:
+            文本块列表
+        """
         chunks = []
-        current_chunk = ""
+        current_parts: List[str] = []
+        current_len = 0
         
-        for sentence in sentences:
+        # 逐句消费，只保留当前块的句子
+        for sentence in self.split_into_sentences(text):
             # 如果当前块加上新句子不超过最大大小
-            if len(current_chunk) + len(sentence) <= self.max_chunk_size:
-                current_chunk += sentence
+            if current_len + len(sentence) <= self.max_chunk_size:
+                current_parts.append(sentence)
+                current_len += len(sentence)
             else:
                 # 保存当前块
-                if len(current_chunk) >= self.min_chunk_size:
-                    chunks.append({
-                        "text": current_chunk,
-                        "timestamp": timestamp or datetime.now().isoformat(),
-                        "length": len(current_chunk)
-                    })
+                if current_len >= self.min_chunk_size:
+                    chunks.append({"text": "".join(current_parts), "timestamp": ts})
                 
                 # 开始新块
-                current_chunk = sentence
+                current_parts = [sentence]
+                current_len = len(sentence)
         
         # 添加最后一个块
-        if current_chunk and len(current_chunk) >= self.min_chunk_size:
-            chunks.append({
-                "text": current_chunk,
-                "timestamp": timestamp or datetime.now().isoformat(),
-                "length": len(current_chunk)
-            })
-        
-        log.info(f"文本分块完成: 原始长度={len(text)}, 块数={len(chunks)}")
+        if current_parts and current_len >= self.min_chunk_size:
+            chunks.append({"text": "".join(current_parts), "timestamp": ts})
         
         return chunks
     
@@ -162,16 +243,9 @@ class TextProcessor:
         """
         # TODO: 实现更复杂的关键词提取算法
         # 这里只是简单的词频统计
-        words = re.findall(r'\w+', text)
-        word_freq = {}
-        
-        for word in words:
-            if len(word) > 1:  # 过滤单字
-                word_freq[word] = word_freq.get(word, 0) + 1
-        
-        # 按频率排序
-        sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
+        words = self._word_re.findall(text)
         
-        return [word for word, freq in sorted_words[:top_k]]
+        # 按频率取前K个
+        return [word for word, _ in Counter(words).most_common(top_k)]
 
 
@@ -1,30 +1,117 @@
 """
 向量数据库模块
-使用ChromaDB存储和检索文本向量
+使用FAISS HNSW索引存储和检索文本向量，文本和元数据保存在SQLite旁路表中
 """
 
-from typing import List, Dict, Any, Optional
-import chromadb
-from sentence_transformers import SentenceTransformer
+import atexit
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import faiss
+import numpy as np
 from soundmem.utils.logger import log
 
+# HNSW图中每个节点的邻居数
+HNSW_M = 32
+
+# 累积到该数量的向量后训练int8标量量化器，此前使用FP32索引暂存
+SQ_TRAIN_SIZE = 10000
+
+# 索引落盘的最短间隔(秒)；旁路表每批提交，中断时多出的记录由_open()丢弃
+INDEX_SAVE_INTERVAL = 30.0
+
+# 批量写入失败（如尚未初始化）后，后台线程的重试间隔(秒)
+FLUSH_RETRY_INTERVAL = 5.0
+
+# GPU上分词后的序列长度按该值向上取整、批大小向上补齐到BATCH_BUCKETS，
+# 限制输入形状的种类以便复用编译结果（检索为单条，入库每批不超过64条）
+TOKEN_BUCKET = 64
+BATCH_BUCKETS = (1, 16, 64)
+
+# CPU上入库编码使用的子进程数，以及交给进程池的最小批量（每个子进程至少分到2条）
+# 一个10分钟识别窗口约产生6~10个文本块，均能达到该批量
+ENCODE_POOL_WORKERS = 2
+ENCODE_POOL_MIN_TEXTS = 2 * ENCODE_POOL_WORKERS
+
+# 导出的ONNX向量模型缓存目录
+ONNX_CACHE_DIR = Path("./data/models")
+
+def _default_normalize(text: str) -> str:
+    """默认的向量化前归一化：小写并合并空白"""
+    return " ".join(text.lower().split())
+
 class VectorStore:
     """向量数据库"""
     
-    def __init__(self, db_path: str = "./data/vectordb", collection_name: str = "soundmem_recordings"):
+    def __init__(self, db_path: str = "./data/vectordb", collection_name: str = "soundmem_recordings",
+                 flush_interval: float = 0.5, flush_batch_size: int = 32, quantization: str = "sq8",
+                 normalizer: Optional[Callable[[str], str]] = None):
         """
         初始化向量数据库
         
         Args:
             db_path: 数据库路径
             collection_name: 集合名称
+            flush_interval: 后台批量写入的间隔(秒)
+            flush_batch_size: 待写入文本达到该数量时立即写入
+            quantization: 向量存储格式，"sq8"为int8标量量化，"none"为FP32
+            normalizer: 向量化前的文本归一化函数，文档和查询使用同一个，保证两侧一致
         """
+        if quantization not in ("sq8", "none"):
+            raise ValueError(f"不支持的量化方式: {quantization}")
+        
         self.db_path = db_path
         self.collection_name = collection_name
-        self.client = None
-        self.collection = None
+        self.quantization = quantization
+        self.normalizer = normalizer or _default_normalize
+        self.index = None  # FAISS索引，首次写入时按向量维度创建
         self.embedding_model = None
         
+        # 旁路存储（SoA）：列表下标即FAISS内部id
+        self.ids: List[str] = []
+        self.docs: List[str] = []
+        self.metas: List[Dict[str, Any]] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self._index_path = Path(db_path) / f"{collection_name}.faiss"
+        self._meta_path = Path(db_path) / f"{collection_name}.sqlite3"
+        # 文档ID = 进程级随机前缀 + 单调计数，无需每条读取系统随机数
+        self._id_prefix = os.urandom(4).hex()
+        self._id_counter = itertools.count()
+        # FAISS索引不支持并发读写，检索与后台写入之间需要加锁
+        self._lock = threading.RLock()
+        # 索引落盘：锁内只做内存序列化，写文件在锁外进行；序号保证较旧的快照不会覆盖较新的
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        self._save_lock = threading.Lock()
+        self._save_seq = itertools.count()
+        self._written_seq = -1
+        # 量化重建在锁外进行；清空或重新打开时递增代数，作废进行中的重建
+        self._quantizing = False
+        self._index_epoch = 0
+        
+        # 查询向量LRU缓存：重复或相同的问题跳过模型前向计算
+        self._encode_query = lru_cache(maxsize=512)(self._encode_query_uncached)
+        
+        # enqueue_texts()的待写入队列，由后台线程合并后一次性向量化
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._pending: List[Tuple[str, Dict[str, Any], Optional[str]]] = []
+        self._pending_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._stop_flush = False
+        self._flush_failing = False
+        # CPU上入库编码的多进程池，首次遇到足够大的批量时才启动；检索仍在主进程编码
+        self._encode_pool = None
+        self._encode_pool_enabled = False
+        self._encode_pool_lock = threading.Lock()
+        
         log.info(f"向量数据库初始化: path={db_path}, collection={collection_name}")
     
     def load_model(self, model_name: str = "BAAI/bge-small-zh-v1.5"):
@@ -35,40 +122,338 @@ class VectorStore:
             model_name: 模型名称
         """
         try:
-            log.info(f"正在加载向量模型: {model_name}")
-            self.embedding_model = SentenceTransformer(model_name)
+            # torch/transformers导入耗时较长，推迟到真正加载模型时
+            import torch
+            from sentence_transformers import SentenceTransformer
+            
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            log.info(f"正在加载向量模型: {model_name} (device={device})")
+            
+            self._stop_encode_pool()
+            self._encode_pool_enabled = False
+            
+            if device == "cuda":
+                # GPU上使用FP16推理，输出在入库/检索前统一转回float32
+                self.embedding_model = SentenceTransformer(model_name, device=device).half()
+                self._compile_for_cuda()
+            else:
+                self.embedding_model = self._load_onnx_model(model_name)
+                if self.embedding_model is None:
+                    self.embedding_model = SentenceTransformer(model_name, device=device)
+                    self._encode_pool_enabled = True
+            
+            self._encode_query.cache_clear()
             log.info("向量模型加载完成")
         except Exception as e:
             log.error(f"加载向量模型失败: {e}")
             raise
     
+    def _compile_for_cuda(self):
+        """GPU上把编码器输入限定在固定的(批大小, 序列长度)桶内并用torch.compile编译；失败时保持eager模式"""
+        import torch
+        import torch.nn.functional as F
+        
+        transformer = self.embedding_model[0]
+        tokenizer = transformer.tokenizer
+        model = transformer.auto_model
+        original_tokenize = transformer.tokenize
+        
+        def restore_eager():
+            transformer.tokenize = original_tokenize
+            model.__dict__.pop("forward", None)
+        
+        def bucketed_tokenize(texts, padding=True):
+            # 与默认分词一致，只是填充长度取TOKEN_BUCKET的整数倍，不截断长文本块
+            return tokenizer(
+                [str(text).strip() for text in texts],
+                padding=padding,
+                truncation="longest_first",
+                max_length=transformer.max_seq_length,
+                pad_to_multiple_of=TOKEN_BUCKET,
+                return_tensors="pt"
+            )
+        
+        def bucketed_forward(input_ids, attention_mask, token_type_ids=None, **kwargs):
+            # 批大小向上补齐到BATCH_BUCKETS（补齐行的注意力掩码为0），输出时截回原批大小
+            n = input_ids.shape[0]
+            size = next((bucket for bucket in BATCH_BUCKETS if bucket >= n), n)
+            padded = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+            if size > n:
+                rows = (0, 0, 0, size - n)
+                padded = {key: F.pad(value, rows) if value is not None else None for key, value in padded.items()}
+            try:
+                outputs = compiled_forward(**padded, **kwargs)
+            except Exception as e:
+                # 新形状重新编译失败等运行期错误：退回eager模式并用原始输入重算本批
+                restore_eager()
+                log.warning(f"编译后的编码器运行失败，已退回eager模式: {e}")
+                return model(input_ids=input_ids, attention_mask=attention_mask,
+                             token_type_ids=token_type_ids, **kwargs)
+            return tuple(output[:n] if torch.is_tensor(output) else output for output in outputs)
+        
+        try:
+            # 不使用CUDA Graph（reduce-overhead）：其状态按线程保存，而编码会在检索线程和后台写入线程上进行
+            compiled_forward = torch.compile(model.forward, mode="max-autotune-no-cudagraphs", dynamic=False)
+            # 每个(批大小, 序列长度)组合编译一次，缓存上限需容纳全部组合，否则超出后退回eager
+            length_buckets = -(-transformer.max_seq_length // TOKEN_BUCKET)
+            torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit,
+                                                        len(BATCH_BUCKETS) * length_buckets)
+            
+            transformer.tokenize = bucketed_tokenize
+            model.forward = bucketed_forward
+            # 编译在首次前向时发生，预热一次以便在这里发现不支持的环境
+            self.embedding_model.encode(["预热"], show_progress_bar=False)
+            # 预热失败时bucketed_forward已退回eager模式并给出警告
+            if model.__dict__.get("forward") is bucketed_forward:
+                log.info(f"编码器已编译，批大小补齐到 {BATCH_BUCKETS}，序列长度补齐到 {TOKEN_BUCKET} 的整数倍")
+        except Exception as e:
+            restore_eager()
+            log.warning(f"编码器编译失败，使用eager模式: {e}")
+    
+    def _get_encode_pool(self):
+        """
+        获取入库编码进程池，首次调用时启动；分词与前向计算不再与检索争用主进程的GIL
+        
+        Returns:
+            进程池；启动失败时返回None，此后入库在主进程编码
+        """
+        with self._encode_pool_lock:
+            if self._encode_pool is None and self._encode_pool_enabled:
+                try:
+                    self._encode_pool = self.embedding_model.start_multi_process_pool(["cpu"] * ENCODE_POOL_WORKERS)
+                    atexit.register(self._stop_encode_pool)
+                    log.info(f"入库编码进程池已启动，进程数: {ENCODE_POOL_WORKERS}")
+                except Exception as e:
+                    self._encode_pool_enabled = False
+                    log.warning(f"启动编码进程池失败，入库在主进程编码: {e}")
+            return self._encode_pool
+    
+    def _stop_encode_pool(self):
+        """停止入库编码进程池"""
+        with self._encode_pool_lock:
+            if self._encode_pool is not None:
+                pool, self._encode_pool = self._encode_pool, None
+                self.embedding_model.stop_multi_process_pool(pool)
+    
+    def _load_onnx_model(self, model_name: str):
+        """
+        在CPU上以ONNX Runtime后端加载向量模型，首次加载时导出并缓存到 ONNX_CACHE_DIR
+        
+        Args:
+            model_name: 模型名称
+            
+        Returns:
+            SentenceTransformer实例；环境不支持ONNX后端时返回None
+        """
+        local_dir = ONNX_CACHE_DIR / (model_name.replace("/", "__") + "-onnx")
+        
+        try:
+            import onnxruntime as ort
+            from sentence_transformers import SentenceTransformer
+            
+            session_options = ort.SessionOptions()
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session_options.intra_op_num_threads = os.cpu_count() or 1
+            
+            model = SentenceTransformer(
+                str(local_dir) if local_dir.exists() else model_name,
+                device="cpu",
+                backend="onnx",
+                model_kwargs={"provider": "CPUExecutionProvider", "session_options": session_options}
+            )
+            
+            if not local_dir.exists():
+                model.save_pretrained(str(local_dir))
+                log.info(f"ONNX向量模型已缓存到: {local_dir}")
+            
+            return model
+            
+        except Exception as e:
+            # 未安装onnxruntime/optimum，或sentence-transformers版本不支持backend参数
+            log.warning(f"ONNX后端不可用，使用PyTorch后端: {e}")
+            return None
+    
     def initialize(self):
         """初始化数据库连接"""
         try:
-            # 创建ChromaDB客户端
-            self.client = chromadb.PersistentClient(
-                path=self.db_path
-            )
+            Path(self.db_path).mkdir(parents=True, exist_ok=True)
             
-            # 获取或创建集合
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"description": "SoundMem录音文本向量库"}
-            )
+            with self._lock:
+                self._open()
             
-            log.info(f"向量数据库初始化完成，当前文档数: {self.collection.count()}")
+            # 启动后台批量写入线程
+            if self._flush_thread is None or not self._flush_thread.is_alive():
+                self._stop_flush = False
+                self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flush_thread.start()
+            
+            log.info(f"向量数据库初始化完成，当前文档数: {self.get_count()}")
             
         except Exception as e:
             log.error(f"初始化向量数据库失败: {e}")
             raise
     
-    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    def _open(self):
+        """打开旁路表并加载索引，修复两者数量不一致的情况"""
+        self._index_epoch += 1
+        self._conn = sqlite3.connect(str(self._meta_path), check_same_thread=False)
+        # WAL模式下提交只追加日志，synchronous=NORMAL时仅在检查点fsync
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "pos INTEGER PRIMARY KEY, id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        
+        rows = self._conn.execute("SELECT id, text, metadata FROM docs ORDER BY pos").fetchall()
+        self.ids = [row[0] for row in rows]
+        self.docs = [row[1] for row in rows]
+        self.metas = [json.loads(row[2]) for row in rows]
+        
+        self.index = faiss.read_index(str(self._index_path)) if self._index_path.exists() else None
+        
+        # 写入过程中断时索引与旁路表可能不一致，以较少的一方为准
+        ntotal = self.index.ntotal if self.index is not None else 0
+        if len(self.docs) > ntotal:
+            log.warning(f"旁路表比索引多 {len(self.docs) - ntotal} 条记录，已丢弃")
+            del self.ids[ntotal:], self.docs[ntotal:], self.metas[ntotal:]
+            self._conn.execute("DELETE FROM docs WHERE pos >= ?", (ntotal,))
+            self._conn.commit()
+        elif len(self.docs) < ntotal:
+            log.warning(f"索引比旁路表多 {ntotal - len(self.docs)} 条向量，正在重建索引")
+            vectors = self.index.reconstruct_n(0, len(self.docs))
+            self.index = self._new_index(self.index.d, vectors)
+            self.index.add(vectors)
+            self._save_index()
+    
+    def _new_index(self, dim: int, train_vectors: Optional[np.ndarray] = None):
         """
-        添加文本到向量库
+        创建空索引
+        
+        Args:
+            dim: 向量维度
+            train_vectors: 训练向量；启用sq8且数量达到SQ_TRAIN_SIZE时创建并训练量化索引
+        """
+        # 向量已归一化，内积即余弦相似度
+        if self.quantization == "sq8" and train_vectors is not None and len(train_vectors) >= SQ_TRAIN_SIZE:
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            index.train(train_vectors)
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+        return index
+    
+    def _maybe_quantize(self):
+        """FP32暂存索引达到训练数量后，训练量化器并转换为int8索引；训练和重建期间不阻塞检索"""
+        with self._lock:
+            if (self.quantization != "sq8" or self._quantizing or not isinstance(self.index, faiss.IndexHNSWFlat)
+                    or self.index.ntotal < SQ_TRAIN_SIZE):
+                return
+            old_index, epoch = self.index, self._index_epoch
+            vectors = old_index.reconstruct_n(0, old_index.ntotal)
+            self._quantizing = True
+        
+        try:
+            # 按原顺序重新插入，索引位置与旁路表保持一致
+            index = self._new_index(old_index.d, vectors)
+            index.add(vectors)
+            
+            with self._lock:
+                if self.index is not old_index or self._index_epoch != epoch:
+                    return
+                # 重建期间新写入的向量按顺序补上
+                start = len(vectors)
+                if old_index.ntotal > start:
+                    index.add(old_index.reconstruct_n(start, old_index.ntotal - start))
+                self.index = index
+                self._unsaved = index.ntotal
+            log.info(f"已用 {len(vectors)} 条向量训练int8量化索引")
+        except Exception as e:
+            # 新文本已入库，量化失败时继续使用FP32索引，下次写入时重试
+            log.error(f"训练int8量化索引失败，继续使用FP32索引: {e}")
+        finally:
+            self._quantizing = False
+    
+    def _save_index(self):
+        """将索引原子地写入磁盘；只在锁内序列化到内存，写文件时不阻塞检索和写入"""
+        with self._lock:
+            if self.index is None:
+                return
+            data = faiss.serialize_index(self.index)
+            seq = next(self._save_seq)
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+        
+        with self._save_lock:
+            if seq < self._written_seq:
+                return
+            tmp_path = str(self._index_path) + ".tmp"
+            data.tofile(tmp_path)
+            os.replace(tmp_path, self._index_path)
+            self._written_seq = seq
+    
+    def _maybe_save_index(self, force: bool = False):
+        """
+        有未落盘的向量且距上次落盘超过INDEX_SAVE_INTERVAL时写入索引
+        
+        Args:
+            force: 忽略时间间隔，只要有未落盘的向量就写入
+        """
+        if not self._unsaved:
+            return
+        if not force and time.monotonic() - self._last_save < INDEX_SAVE_INTERVAL:
+            return
+        try:
+            self._save_index()
+        except Exception as e:
+            log.error(f"保存向量索引失败: {e}")
+    
+    def _encode(self, texts: List[str], use_pool: bool = False) -> np.ndarray:
+        """
+        计算归一化向量
         
         Args:
             texts: 文本列表
+            use_pool: 批量足够大时交给编码进程池（仅入库使用）
+            
+        Returns:
+            (N, d) 的C连续float32数组，可直接传给FAISS
+        """
+        pool = None
+        if use_pool and self._encode_pool_enabled and len(texts) >= ENCODE_POOL_MIN_TEXTS:
+            pool = self._get_encode_pool()
+        if pool is not None:
+            embeddings = np.ascontiguousarray(
+                self.embedding_model.encode_multi_process(texts, pool, batch_size=64),
+                dtype=np.float32
+            )
+            # encode_multi_process不做归一化，原地归一化后内积即余弦相似度
+            faiss.normalize_L2(embeddings)
+            return embeddings
+        
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        # 已是float32时不发生拷贝；FP16模型的输出在此统一转换一次
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                  embedding_texts: Optional[List[Optional[str]]] = None) -> List[str]:
+        """
+        添加文本到向量库
+        
+        Args:
+            texts: 文本列表（原文，入库并在检索结果中返回）
             metadatas: 元数据列表
+            embedding_texts: 用于向量化的归一化文本，缺省或为None的项由normalizer从原文计算
             
         Returns:
             文档ID列表
@@ -76,27 +461,45 @@ class VectorStore:
         if not texts:
             return []
         
-        if self.collection is None:
+        if self._conn is None:
             raise RuntimeError("数据库未初始化，请先调用initialize()")
         
         if self.embedding_model is None:
             raise RuntimeError("向量模型未加载，请先调用load_model()")
         
         try:
-            # 生成向量
-            embeddings = self.embedding_model.encode(texts, show_progress_bar=False)
+            # 生成向量（整批一次前向计算）
+            embedding_texts = embedding_texts or [None] * len(texts)
+            vectors = self._encode(
+                [emb if emb is not None else self.normalizer(text) for text, emb in zip(texts, embedding_texts)],
+                use_pool=True
+            )
             
             # 生成ID
-            import uuid
-            ids = [str(uuid.uuid4()) for _ in texts]
-            
-            # 添加到数据库
-            self.collection.add(
-                embeddings=embeddings.tolist(),
-                documents=texts,
-                metadatas=metadatas or [{} for _ in texts],
-                ids=ids
-            )
+            ids = [f"{self._id_prefix}-{next(self._id_counter):012x}" for _ in texts]
+            metadatas = metadatas or [{} for _ in texts]
+            
+            with self._lock:
+                if self.index is None:
+                    self.index = self._new_index(vectors.shape[1])
+                
+                # 新向量在索引中的位置从当前总数开始
+                start = self.index.ntotal
+                self.index.add(vectors)
+                self.ids.extend(ids)
+                self.docs.extend(texts)
+                self.metas.extend(metadatas)
+                
+                self._conn.executemany(
+                    "INSERT INTO docs (pos, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(start + i, doc_id, text, json.dumps(metadata, ensure_ascii=False))
+                     for i, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas))]
+                )
+                # 旁路表每批提交，索引由后台线程定期落盘，中断时由_open()按较少的一方修复
+                self._conn.commit()
+                self._unsaved += len(texts)
+            
+            self._maybe_quantize()
             
             log.info(f"成功添加 {len(texts)} 条文本到向量库")
             
@@ -106,80 +509,233 @@ class VectorStore:
             log.error(f"添加文本到向量库失败: {e}")
             raise
     
-    def search(self, query: str, top_k: int = 5, filter_dict: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    def enqueue_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                      embedding_texts: Optional[List[Optional[str]]] = None):
         """
-        搜索相似文本
+        非阻塞地提交文本，由后台线程合并后批量写入向量库
+        
+        Args:
+            texts: 文本列表
+            metadatas: 元数据列表
+            embedding_texts: 用于向量化的归一化文本，参见add_texts()
+        """
+        if not texts:
+            return
+        
+        with self._pending_lock:
+            self._pending.extend(zip(texts, metadatas or [{} for _ in texts],
+                                     embedding_texts or [None] * len(texts)))
+            pending_count = len(self._pending)
+        
+        if pending_count >= self.flush_batch_size:
+            self._flush_event.set()
+    
+    def flush(self) -> List[str]:
+        """
+        立即写入所有待写入的文本；写入失败时文本放回队列头部，稍后重试
+        
+        Returns:
+            写入的文档ID列表
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        
+        if not pending:
+            return []
+        
+        texts = [text for text, _, _ in pending]
+        metadatas = [metadata for _, metadata, _ in pending]
+        embedding_texts = [emb for _, _, emb in pending]
+        
+        try:
+            ids = self.add_texts(texts, metadatas, embedding_texts)
+        except Exception as e:
+            with self._pending_lock:
+                self._pending[:0] = pending
+            # 连续失败时只提示一次，避免后台重试刷屏
+            if not self._flush_failing:
+                log.warning(f"写入向量库失败，{len(texts)} 条文本已放回队列，稍后重试: {e}")
+            self._flush_failing = True
+            return []
+        
+        if self._flush_failing:
+            log.info("向量库写入已恢复")
+            self._flush_failing = False
+        return ids
+    
+    def _flush_loop(self):
+        """后台批量写入循环：定时或队列积累到flush_batch_size时写入，并定期落盘索引"""
+        while not self._stop_flush:
+            self._flush_event.wait(FLUSH_RETRY_INTERVAL if self._flush_failing else self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+            self._maybe_save_index()
+    
+    def close(self):
+        """停止后台写入线程和编码进程池，写入剩余文本、落盘索引并关闭旁路表"""
+        self._stop_flush = True
+        self._flush_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=5)
+            self._flush_thread = None
+        self.flush()
+        if self._pending:
+            log.warning(f"关闭向量库时仍有 {len(self._pending)} 条文本未能写入")
+        self._maybe_save_index(force=True)
+        self._stop_encode_pool()
+        
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def search_soa(self, query: str, top_k: int = 5, filter_dict: Optional[Dict[str, Any]] = None) -> Dict[str, List[Any]]:
+        """
+        搜索相似文本，按字段返回并行数组（SoA）
         
         Args:
             query: 查询文本
             top_k: 返回前K个结果
-            filter_dict: 过滤条件
+            filter_dict: 过滤条件（元数据等值匹配）
             
         Returns:
-            搜索结果列表
+            字典，包含等长的 texts / timestamps / metadatas / distances / ids 列表
         """
-        if self.collection is None:
+        if self._conn is None:
             raise RuntimeError("数据库未初始化，请先调用initialize()")
         
         if self.embedding_model is None:
             raise RuntimeError("向量模型未加载，请先调用load_model()")
         
+        texts, timestamps, metadatas, distances, ids = [], [], [], [], []
+        
         try:
-            # 生成查询向量
-            query_embedding = self.embedding_model.encode([query], show_progress_bar=False)[0]
-            
-            # 搜索
-            results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k,
-                where=filter_dict
-            )
+            # 生成查询向量（与文档相同的归一化后走缓存）
+            q_norm = self.normalizer(query)
+            query_embedding = self._encode_query(q_norm)
+            log.debug(f"查询向量缓存: {self._encode_query.cache_info()}")
             
-            # 格式化结果
-            formatted_results = []
-            if results['documents'] and len(results['documents']) > 0:
-                for i in range(len(results['documents'][0])):
-                    formatted_results.append({
-                        'text': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
-                        'distance': results['distances'][0][i] if results['distances'] else 0,
-                        'id': results['ids'][0][i]
-                    })
+            with self._lock:
+                if self.index is not None and self.index.ntotal > 0:
+                    # 有过滤条件时多取一些候选，过滤后再截断到top_k
+                    k = min(self.index.ntotal, top_k * 4 if filter_dict else top_k)
+                    self.index.hnsw.efSearch = max(k * 4, 50)
+                    scores, positions = self.index.search(query_embedding, k)
+                    
+                    for score, pos in zip(scores[0], positions[0]):
+                        if pos < 0 or len(texts) >= top_k:
+                            continue
+                        metadata = self.metas[pos]
+                        if filter_dict and any(metadata.get(key) != value for key, value in filter_dict.items()):
+                            continue
+                        texts.append(self.docs[pos])
+                        timestamps.append(metadata.get('timestamp', '未知时间'))
+                        metadatas.append(metadata)
+                        distances.append(1.0 - float(score))  # 余弦距离
+                        ids.append(self.ids[pos])
             
-            log.info(f"搜索完成，返回 {len(formatted_results)} 条结果")
-            
-            return formatted_results
+            log.info(f"搜索完成，返回 {len(texts)} 条结果")
             
         except Exception as e:
             log.error(f"搜索失败: {e}")
-            return []
+            texts, timestamps, metadatas, distances, ids = [], [], [], [], []
+        
+        return {
+            'texts': texts,
+            'timestamps': timestamps,
+            'metadatas': metadatas,
+            'distances': distances,
+            'ids': ids
+        }
+    
+    def _encode_query_uncached(self, q_norm: str) -> np.ndarray:
+        """
+        计算查询向量
+        
+        Args:
+            q_norm: 归一化后的查询文本
+            
+        Returns:
+            (1, d) 的只读float32数组，可直接传给FAISS并安全缓存
+        """
+        embedding = self._encode([q_norm])
+        embedding.flags.writeable = False
+        return embedding
+    
+    def search(self, query: str, top_k: int = 5, filter_dict: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        搜索相似文本
+        
+        Args:
+            query: 查询文本
+            top_k: 返回前K个结果
+            filter_dict: 过滤条件
+            
+        Returns:
+            搜索结果列表
+        """
+        return self.to_results(self.search_soa(query, top_k=top_k, filter_dict=filter_dict))
+    
+    @staticmethod
+    def to_results(soa: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        """
+        将search_soa的并行数组还原为逐条结果字典
+        
+        Args:
+            soa: search_soa的返回值
+            
+        Returns:
+            搜索结果列表
+        """
+        return [
+            {'text': text, 'metadata': metadata, 'distance': distance, 'id': doc_id}
+            for text, metadata, distance, doc_id in zip(soa['texts'], soa['metadatas'], soa['distances'], soa['ids'])
+        ]
     
     def delete_collection(self):
         """删除集合"""
-        if self.client and self.collection_name:
+        with self._lock:
             try:
-                self.client.delete_collection(name=self.collection_name)
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                # 作废尚未写完的索引快照，避免删除后被重新写回
+                with self._save_lock:
+                    self._written_seq = next(self._save_seq)
+                self._unsaved = 0
+                wal_files = [Path(str(self._meta_path) + suffix) for suffix in ("-wal", "-shm")]
+                for path in (self._index_path, self._meta_path, *wal_files):
+                    if path.exists():
+                        path.unlink()
+                self.index = None
+                self._index_epoch += 1
+                self.ids, self.docs, self.metas = [], [], []
                 log.info(f"集合 {self.collection_name} 已删除")
             except Exception as e:
                 log.error(f"删除集合失败: {e}")
     
     def get_count(self) -> int:
         """获取文档数量"""
-        if self.collection:
-            return self.collection.count()
-        return 0
+        return len(self.docs)
     
     def clear(self):
         """清空集合"""
-        if self.collection:
+        with self._pending_lock:
+            self._pending = []
+        
+        if self._conn is not None:
             try:
-                # 删除并重新创建集合
-                self.delete_collection()
-                self.collection = self.client.get_or_create_collection(
-                    name=self.collection_name,
-                    metadata={"description": "SoundMem录音文本向量库"}
-                )
+                # 原地清空索引和旁路表，不删除文件也不重新打开连接
+                with self._lock:
+                    if self.index is not None:
+                        self.index.reset()
+                        self._index_epoch += 1
+                        self._save_index()
+                    self.ids.clear()
+                    self.docs.clear()
+                    self.metas.clear()
+                    self._conn.execute("DELETE FROM docs")
+                    self._conn.commit()
                 log.info("向量库已清空")
             except Exception as e:
                 log.error(f"清空向量库失败: {e}")
-
@@ -6,8 +6,9 @@ import gradio as gr
 import threading
 import queue
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 import numpy as np
 
 from soundmem.core import AudioRecorder, ASREngine, TextProcessor, VectorStore, RAGEngine
@@ -32,31 +33,50 @@ class SoundMemApp:
         )
         
         self.asr_engine = ASREngine()
+        # 单声道录音输出一维float32，可跳过格式检查直接走快速路径
+        self._transcribe = (self.asr_engine.transcribe_mono_f32 if self.config.channels == 1
+                            else self.asr_engine.transcribe)
+        # 预先计算能量阈值的平方，逐块比较时省去开方
+        self._energy_thr_sq = self.config.energy_threshold ** 2
         self.text_processor = TextProcessor()
         self.vector_store = VectorStore(
             db_path=self.config.vector_db_path,
-            collection_name=self.config.collection_name
+            collection_name=self.config.collection_name,
+            quantization=self.config.quantization,
+            normalizer=self.text_processor.normalize_for_embedding
         )
         
         self.rag_engine: Optional[RAGEngine] = None
+        self._rag_key: Optional[tuple] = None  # 当前RAG引擎对应的 (api_key, base_url, model_name)
         
         # 状态变量
         self.is_recording = False
-        self.transcription_text = ""
+        self._transcript_chunks: List[str] = []  # 按识别段追加，显示时再拼接
         self.processing_thread: Optional[threading.Thread] = None
-        self.stop_processing = False
         
         log.info("SoundMem应用初始化完成")
     
+    @property
+    def transcription_text(self) -> str:
+        """当前会话的完整转写文本"""
+        return "".join(self._transcript_chunks)
+    
     def initialize_models(self, progress=gr.Progress()):
         """初始化模型"""
         try:
-            progress(0, desc="正在加载ASR模型...")
-            self.asr_engine.load_model()
+            progress(0, desc="正在加载ASR模型和向量模型...")
             
-            progress(0.5, desc="正在加载向量模型...")
-            self.vector_store.load_model()
-            self.vector_store.initialize()
+            # 各任务主要耗时在释放GIL的IO/C扩展中，并行执行；打开向量库不依赖向量模型
+            tasks = {
+                self.asr_engine.load_model: "ASR模型",
+                self.vector_store.load_model: "向量模型",
+                self.vector_store.initialize: "向量数据库",
+            }
+            with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+                futures = {executor.submit(fn): name for fn, name in tasks.items()}
+                for done, future in enumerate(as_completed(futures), 1):
+                    future.result()
+                    progress(done / len(futures), desc=f"{futures[future]}加载完成")
             
             progress(1.0, desc="模型加载完成！")
             
@@ -74,8 +94,7 @@ class SoundMemApp:
             # 启动录音
             self.recorder.start_recording()
             self.is_recording = True
-            self.stop_processing = False
-            self.transcription_text = ""
+            self._transcript_chunks = []
             
             # 启动处理线程
             self.processing_thread = threading.Thread(target=self._process_audio_loop)
@@ -95,8 +114,8 @@ class SoundMemApp:
         
         try:
             # 停止录音
+            # 停止录音后处理线程取完剩余音频会收到None并退出
             self.is_recording = False
-            self.stop_processing = True
             self.recorder.stop_recording()
             
             # 等待处理线程结束
@@ -113,138 +132,177 @@ class SoundMemApp:
     def _process_audio_loop(self):
         """音频处理循环（在独立线程中运行）
         
-        优化策略：每10分钟识别一次，最大化上下文
+        优化策略：累积到asr_max_segment_sec（默认10分钟）再识别，最大化上下文
         """
-        audio_buffer = []
-        buffer_duration = 0
+        # 单次识别的最大音频时长，同时限定缓冲区大小和单次识别耗时
+        recognition_interval = float(self.config.asr_max_segment_sec)
+        sample_rate = self.config.sample_rate
+        
+        # 预分配识别窗口的缓冲区，按写入位置追加，避免每次识别时拼接
+        # 双缓冲：一个窗口交给识别线程时，另一个继续接收音频，录音缓冲区不会因识别耗时而溢出
+        max_samples = int(sample_rate * recognition_interval)
+        shape = (max_samples,) if self.config.channels == 1 else (max_samples, self.config.channels)
+        buffers = [np.empty(shape, dtype=np.float32) for _ in range(2)]
+        pending: List[Optional[Future]] = [None, None]  # 各缓冲区上尚未完成的识别任务
+        current = 0
+        audio_buffer = buffers[current]
+        w = 0
+        
+        # 静音检测默认关闭（energy_threshold=0），此时每个窗口都识别
+        energy_gate = self._energy_thr_sq > 0
+        has_speech = not energy_gate  # 当前窗口内是否出现过超过能量阈值的音频块
+        
+        log.info(f"音频处理循环启动，识别间隔: {recognition_interval/60:.1f}分钟")
+        
+        # 单个识别线程，保证识别结果按窗口顺序追加
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr")
+        try:
+            while True:
+                # 阻塞获取音频块，录音停止且缓冲区取完时返回None
+                audio_chunk = self.recorder.get_audio_chunk()
+                
+                if audio_chunk is None:
+                    break
+                
+                # 一次取出的积压可能超过窗口剩余空间甚至多个窗口，逐窗口切分写入
+                n = len(audio_chunk)
+                offset = 0
+                while offset < n:
+                    take = min(n - offset, max_samples - w)
+                    segment = audio_chunk[offset:offset + take]
+                    offset += take
+                    
+                    # 能量检测：点积求平方和，不产生临时数组
+                    if not has_speech:
+                        x = segment.ravel()
+                        has_speech = float(np.dot(x, x)) / x.size > self._energy_thr_sq
+                    
+                    audio_buffer[w:w + take] = segment
+                    w += take
+                    
+                    # 达到最大时长才识别
+                    if w == max_samples:
+                        # 缓冲区视图交给识别线程，本线程切换到另一个缓冲区继续读取录音
+                        pending[current] = executor.submit(self._recognize_window, audio_buffer[:w], has_speech)
+                        current ^= 1
+                        # 另一个缓冲区上的识别完成后才能覆盖（识别慢于实时时在此等待）
+                        if pending[current] is not None:
+                            pending[current].result()
+                            pending[current] = None
+                        audio_buffer = buffers[current]
+                        w = 0
+                        has_speech = not energy_gate
+                
+                # 时长由写入位置换算，不做浮点累加
+                buffer_duration = w / sample_rate
+                
+                # 每分钟输出一次进度
+                if int(buffer_duration) % 60 == 0 and buffer_duration > 0:
+                    log.info(f"已录音 {buffer_duration/60:.1f} 分钟，等待识别...")
+            
+            # 停止录音时：处理剩余的所有音频
+            if w > 0:
+                executor.submit(self._recognize_window, audio_buffer[:w], has_speech, True)
         
-        # 优化策略：累积10分钟音频再识别，给VAD最大的上下文
-        recognition_interval = 600.0  # 10分钟 = 600秒
+        finally:
+            # 等待所有窗口识别完成
+            executor.shutdown(wait=True)
+            # 录音结束时立即写入尚未落库的文本
+            self.vector_store.flush()
         
-        accumulated_text = ""  # 累积的完整文本
+        if self._transcript_chunks:
+            log.info(f"录音结束，共 {len(self._transcript_chunks)} 段转写文本")
         
-        log.info(f"音频处理循环启动，识别间隔: {recognition_interval/60:.0f}分钟")
+        log.info("音频处理循环结束")
+    
+    def _recognize_window(self, audio_data: np.ndarray, has_speech: bool, final: bool = False):
+        """
+        识别一个窗口的音频，结果追加到转写文本并提交到向量库（在识别线程中运行）
         
-        while not self.stop_processing:
-            # 获取音频块
-            audio_chunk = self.recorder.get_audio_chunk(timeout=0.5)
-            
-            if audio_chunk is None:
-                continue
+        Args:
+            audio_data: 窗口音频（float32），识别完成前调用方不会覆盖
+            has_speech: 窗口内是否有超过能量阈值的音频
+            final: 是否为停止录音时剩余的音频
+        """
+        try:
+            duration = len(audio_data) / self.config.sample_rate
             
-            # 添加到缓冲区
-            audio_buffer.append(audio_chunk)
-            chunk_duration = len(audio_chunk) / self.config.sample_rate
-            buffer_duration += chunk_duration
+            if not has_speech:
+                # 整个窗口能量都低于阈值，跳过识别；说话声音较小时需调低ENERGY_THRESHOLD
+                log.warning(f"{duration:.1f} 秒音频的能量均低于阈值 {self.config.energy_threshold}，"
+                            f"已跳过识别（可调低或将ENERGY_THRESHOLD设为0关闭）")
+                return
             
-            # 每分钟输出一次进度
-            if int(buffer_duration) % 60 == 0 and buffer_duration > 0:
-                log.info(f"已录音 {buffer_duration/60:.1f} 分钟，等待识别...")
+            if final:
+                log.info(f"停止录音，处理剩余 {duration:.1f} 秒的音频")
+            else:
+                log.info(f"达到识别间隔，开始识别 {duration/60:.1f} 分钟的音频")
             
-            # 达到10分钟才识别
-            if buffer_duration >= recognition_interval and audio_buffer:
-                log.info(f"达到识别间隔，开始识别 {buffer_duration/60:.1f} 分钟的音频")
-                
-                # 合并音频
-                audio_data = np.concatenate(audio_buffer, axis=0)
-                
-                # 使用批处理识别
-                result = self.asr_engine.transcribe(audio_data, self.config.sample_rate)
-                
-                if result['success'] and result['text']:
-                    text = result['text'].strip()
-                    
-                    if text:
-                        # 累积文本
-                        if accumulated_text:
-                            accumulated_text += " " + text
-                        else:
-                            accumulated_text = text
-                        
-                        # 更新显示
-                        timestamp = datetime.now().isoformat()
-                        self.transcription_text = f"[{timestamp}] {accumulated_text}\n\n"
-                        
-                        log.info(f"识别到文本长度: {len(text)} 字符")
-                        log.info(f"文本预览: {text[:100]}..." if len(text) > 100 else f"识别到文本: {text}")
-                        
-                        # 如果有分段信息，记录
-                        if 'segments' in result and result['segments']:
-                            log.info(f"FunASR返回了 {len(result['segments'])} 个分段")
-                        
-                        # 立即保存到向量库
-                        chunks = self.text_processor.chunk_text(text, timestamp)
-                        if chunks:
-                            texts = [chunk['text'] for chunk in chunks]
-                            metadatas = [{'timestamp': chunk['timestamp']} for chunk in chunks]
-                            self.vector_store.add_texts(texts, metadatas)
-                            log.info(f"已保存 {len(chunks)} 个文本块到向量库")
-                else:
-                    log.warning(f"识别失败或无文本: success={result['success']}")
-                
-                # 清空缓冲区，开始下一个10分钟
-                audio_buffer = []
-                buffer_duration = 0
-        
-        # 停止录音时：处理剩余的所有音频
-        if audio_buffer and buffer_duration > 0:
-            log.info(f"停止录音，处理剩余 {buffer_duration:.1f} 秒的音频")
+            # 使用批处理识别
+            result = self._transcribe(audio_data, self.config.sample_rate)
             
-            # 合并所有剩余音频
-            audio_data = np.concatenate(audio_buffer, axis=0)
+            if not (result['success'] and result['text']):
+                log.warning(f"识别失败或无文本: success={result['success']}")
+                return
             
-            # 识别剩余音频
-            result = self.asr_engine.transcribe(audio_data, self.config.sample_rate)
+            text = result['text'].strip()
+            if not text:
+                return
             
-            if result['success'] and result['text']:
-                text = result['text'].strip()
-                if text:
-                    # 累积到总文本
-                    if accumulated_text:
-                        accumulated_text += " " + text
-                    else:
-                        accumulated_text = text
-                    
-                    log.info(f"剩余音频识别完成，文本长度: {len(text)} 字符")
-                    log.info(f"文本预览: {text[:100]}..." if len(text) > 100 else f"识别到文本: {text}")
-                    
-                    # 保存到向量库
-                    timestamp = datetime.now().isoformat()
-                    chunks = self.text_processor.chunk_text(text, timestamp)
-                    if chunks:
-                        texts = [chunk['text'] for chunk in chunks]
-                        metadatas = [{'timestamp': chunk['timestamp']} for chunk in chunks]
-                        self.vector_store.add_texts(texts, metadatas)
-                        log.info(f"已保存剩余 {len(chunks)} 个文本块到向量库")
-        
-        # 更新最终显示
-        if accumulated_text:
+            # 追加到显示文本
             timestamp = datetime.now().isoformat()
-            self.transcription_text = f"[{timestamp}] {accumulated_text}\n\n"
-            log.info(f"录音结束，总文本长度: {len(accumulated_text)} 字符")
+            self._transcript_chunks.append(f"[{timestamp}] {text}\n\n")
+            
+            log.info(f"识别到文本长度: {len(text)} 字符")
+            log.info(f"文本预览: {text[:100]}..." if len(text) > 100 else f"识别到文本: {text}")
+            
+            # 如果有分段信息，记录
+            if 'segments' in result and result['segments']:
+                log.info(f"FunASR返回了 {len(result['segments'])} 个分段")
+            
+            # 立即保存到向量库
+            chunks = self.text_processor.chunk_text(text, timestamp)
+            if chunks:
+                texts = [chunk['text'] for chunk in chunks]
+                metadatas = [{'timestamp': chunk['timestamp']} for chunk in chunks]
+                embedding_texts = [chunk['embedding_text'] for chunk in chunks]
+                self.vector_store.enqueue_texts(texts, metadatas, embedding_texts)
+                log.info(f"已提交 {len(chunks)} 个文本块到向量库")
         
-        log.info("音频处理循环结束")
+        except Exception as e:
+            # 单个窗口失败不影响后续窗口
+            log.error(f"识别窗口处理失败: {e}")
     
-    def chat(self, message, history, api_key, base_url, model_name):
+    async def chat(self, message, history, api_key, base_url, model_name):
         """聊天功能"""
         if not message:
             return history, ""
         
-        # 初始化RAG引擎（如果需要）
-        if self.rag_engine is None or api_key:
+        # 初始化RAG引擎：配置变化时才重建，复用已建立的HTTP连接池
+        rag_key = (
+            api_key or self.config.openai_api_key,
+            base_url or self.config.openai_base_url,
+            model_name or self.config.model_name
+        )
+        if self.rag_engine is None or self._rag_key != rag_key:
             try:
+                if self.rag_engine is not None:
+                    await self.rag_engine.aclose()
                 self.rag_engine = RAGEngine(
                     vector_store=self.vector_store,
-                    api_key=api_key or self.config.openai_api_key,
-                    base_url=base_url or self.config.openai_base_url,
-                    model_name=model_name or self.config.model_name
+                    api_key=rag_key[0],
+                    base_url=rag_key[1],
+                    model_name=rag_key[2]
                 )
+                self._rag_key = rag_key
             except Exception as e:
+                self.rag_engine = None
+                self._rag_key = None
                 history.append((message, f"❌ 初始化失败: {str(e)}"))
                 return history, ""
         
         # 查询
-        result = self.rag_engine.query(
+        result = await self.rag_engine.query(
             message,
             top_k=self.config.top_k,
             temperature=self.config.temperature,
@@ -271,15 +329,23 @@ class SoundMemApp:
         """清空数据库"""
         try:
             self.vector_store.clear()
-            self.transcription_text = ""
+            self._transcript_chunks = []
             return "✅ 向量库已清空", ""
         except Exception as e:
             return f"❌ 清空失败: {str(e)}", self.transcription_text
 
-def create_app():
-    """创建Gradio应用"""
+def create_app(preload_models: bool = False):
+    """
+    创建Gradio应用
+    
+    Args:
+        preload_models: 是否在后台线程预加载ASR模型，与Gradio启动并行
+    """
     app = SoundMemApp()
     
+    if preload_models:
+        app.asr_engine.preload()
+    
     with gr.Blocks(title="SoundMem - 智能录音记忆助手", theme=gr.themes.Soft()) as demo:
         gr.Markdown("""
         # 🎙️ SoundMem - 智能录音记忆助手
@@ -3,50 +3,49 @@
 """
 
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
 
-# 加载环境变量
+# 加载环境变量（模块只导入一次，.env只扫描一次）
 load_dotenv()
 
-class Config(BaseModel):
-    """配置类"""
-    
-    model_config = {
-        "protected_namespaces": (),  # 允许使用model_开头的字段名
-        "env_file": ".env",
-        "env_file_encoding": "utf-8"
-    }
+@dataclass(frozen=True, slots=True)
+class Config:
+    """配置类（只读，由load_config()从环境变量构建）"""
     
     # API配置
-    openai_api_key: str = Field(default="", description="OpenAI API Key")
-    openai_base_url: str = Field(default="https://api.openai.com/v1", description="API Base URL")
-    model_name: str = Field(default="gpt-3.5-turbo", description="模型名称")
-    temperature: float = Field(default=0.7, description="温度参数")
-    max_tokens: int = Field(default=2000, description="最大token数")
+    openai_api_key: str = ""  # OpenAI API Key
+    openai_base_url: str = "https://api.openai.com/v1"  # API Base URL
+    model_name: str = "gpt-3.5-turbo"  # 模型名称
+    temperature: float = 0.7  # 温度参数
+    max_tokens: int = 2000  # 最大token数
     
     # 向量数据库配置
-    vector_db_path: str = Field(default="./data/vectordb", description="向量数据库路径")
-    collection_name: str = Field(default="soundmem_recordings", description="集合名称")
+    vector_db_path: str = "./data/vectordb"  # 向量数据库路径
+    collection_name: str = "soundmem_recordings"  # 集合名称
+    quantization: str = "sq8"  # 向量存储格式(sq8/none)
     
     # 录音配置
-    sample_rate: int = Field(default=16000, description="采样率")
-    channels: int = Field(default=1, description="声道数")
-    chunk_duration: int = Field(default=5, description="音频块时长(秒)")
+    sample_rate: int = 16000  # 采样率
+    channels: int = 1  # 声道数
+    chunk_duration: int = 5  # 音频块时长(秒)
+    asr_max_segment_sec: float = 600.0  # 单次识别的最大音频时长(秒)
+    energy_threshold: float = 0.0  # 静音判定的RMS能量阈值，0表示不做静音检测
     
     # RAG配置
-    top_k: int = Field(default=5, description="检索Top-K")
-    similarity_threshold: float = Field(default=0.5, description="相似度阈值")
+    top_k: int = 5  # 检索Top-K
+    similarity_threshold: float = 0.5  # 相似度阈值
     
     # 日志配置
-    log_level: str = Field(default="INFO", description="日志级别")
-    log_path: str = Field(default="./logs", description="日志路径")
+    log_level: str = "INFO"  # 日志级别
+    log_path: str = "./logs"  # 日志路径
 
+@lru_cache(maxsize=1)
 def load_config() -> Config:
-    """加载配置"""
-    return Config(
+    """加载配置（进程内只解析一次，返回共享实例）"""
+    config = Config(
         openai_api_key=os.getenv("OPENAI_API_KEY", ""),
         openai_base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
         model_name=os.getenv("MODEL_NAME", "gpt-3.5-turbo"),
@@ -54,14 +53,22 @@ def load_config() -> Config:
         max_tokens=int(os.getenv("MAX_TOKENS", "2000")),
         vector_db_path=os.getenv("VECTOR_DB_PATH", "./data/vectordb"),
         collection_name=os.getenv("COLLECTION_NAME", "soundmem_recordings"),
+        quantization=os.getenv("QUANTIZATION", "sq8"),
         sample_rate=int(os.getenv("SAMPLE_RATE", "16000")),
         channels=int(os.getenv("CHANNELS", "1")),
         chunk_duration=int(os.getenv("CHUNK_DURATION", "5")),
+        asr_max_segment_sec=float(os.getenv("ASR_MAX_SEGMENT_SEC", "600")),
+        energy_threshold=float(os.getenv("ENERGY_THRESHOLD", "0")),
         top_k=int(os.getenv("TOP_K", "5")),
         similarity_threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.5")),
         log_level=os.getenv("LOG_LEVEL", "INFO"),
         log_path=os.getenv("LOG_PATH", "./logs")
     )
+    
+    if config.asr_max_segment_sec * config.sample_rate < 1:
+        raise ValueError(f"ASR_MAX_SEGMENT_SEC必须大于0: {config.asr_max_segment_sec}")
+    
+    return config
 
 def get_project_root() -> Path:
     """获取项目根目录"""
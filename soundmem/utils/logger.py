@@ -2,14 +2,23 @@
 日志工具模块
 """
 
+import os
 import sys
 from pathlib import Path
 from loguru import logger
-from soundmem.utils.config import load_config
+
+# 是否已完成日志配置，避免重复调用时叠加处理器
+_configured = False
 
 def setup_logger():
     """设置日志"""
-    config = load_config()
+    global _configured
+    if _configured:
+        return logger
+    
+    # 日志只需要两项配置，直接读取环境变量，不必构建完整的Config
+    log_level = os.getenv("LOG_LEVEL", "INFO")
+    log_path = Path(os.getenv("LOG_PATH", "./logs"))
     
     # 移除默认处理器
     logger.remove()
@@ -18,24 +27,24 @@ def setup_logger():
     logger.add(
         sys.stdout,
         format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level=config.log_level,
+        level=log_level,
         colorize=True
     )
     
     # 添加文件输出
-    log_path = Path(config.log_path)
     log_path.mkdir(parents=True, exist_ok=True)
     
     logger.add(
         log_path / "soundmem_{time:YYYY-MM-DD}.log",
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level=config.log_level,
+        level=log_level,
         rotation="00:00",  # 每天轮转
         retention="7 days",  # 保留7天
         compression="zip",  # 压缩旧日志
         encoding="utf-8"
     )
     
+    _configured = True
     return logger
 
 # 导出全局logger实例
@@ -0,0 +1,118 @@
+"""
+音频处理循环测试
+使用短识别窗口验证缓冲区切分、静音检测开关和配置校验
+"""
+
+import numpy as np
+import pytest
+
+gradio_app = pytest.importorskip("soundmem.ui.gradio_app")
+
+from soundmem.core.text_processor import TextProcessor
+from soundmem.utils.config import Config, load_config
+
+SAMPLE_RATE = 16000
+
+
+class FakeRecorder:
+    """按顺序返回预置音频块，取完后返回None（与录音停止时一致）"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def get_audio_chunk(self, timeout=None):
+        return self.chunks.pop(0) if self.chunks else None
+
+
+class FakeVectorStore:
+    """记录提交的文本和flush调用"""
+
+    def __init__(self):
+        self.texts = []
+        self.flush_count = 0
+
+    def enqueue_texts(self, texts, metadatas=None, embedding_texts=None):
+        self.texts.extend(texts)
+
+    def flush(self):
+        self.flush_count += 1
+
+
+def make_app(segment_sec, chunks, energy_threshold=0.0):
+    """构造跳过模型和录音设备初始化的SoundMemApp，识别结果记录在app.windows中"""
+    app = gradio_app.SoundMemApp.__new__(gradio_app.SoundMemApp)
+    app.config = Config(sample_rate=SAMPLE_RATE, asr_max_segment_sec=segment_sec,
+                        energy_threshold=energy_threshold)
+    app._energy_thr_sq = energy_threshold ** 2
+    app.recorder = FakeRecorder(chunks)
+    app.text_processor = TextProcessor()
+    app.vector_store = FakeVectorStore()
+    app._transcript_chunks = []
+    app.windows = []
+
+    def transcribe(audio_data, sample_rate):
+        app.windows.append(audio_data.copy())
+        return {'success': True, 'text': f"第{len(app.windows)}段识别文本"}
+
+    app._transcribe = transcribe
+    return app
+
+
+def test_backlog_longer_than_window_is_split():
+    """一次取出的积压超过多个窗口时逐窗口识别，音频不丢失、不重复"""
+    chunks = [np.arange(5 * SAMPLE_RATE, dtype=np.float32),
+              np.full(SAMPLE_RATE // 2, -1.0, dtype=np.float32)]
+    app = make_app(2, chunks)
+
+    app._process_audio_loop()
+
+    assert [len(window) for window in app.windows] == [2 * SAMPLE_RATE, 2 * SAMPLE_RATE, 3 * SAMPLE_RATE // 2]
+    np.testing.assert_array_equal(np.concatenate(app.windows), np.concatenate(chunks))
+    assert len(app._transcript_chunks) == 3
+    assert app.vector_store.texts == ["第1段识别文本", "第2段识别文本", "第3段识别文本"]
+    assert app.vector_store.flush_count == 1
+
+
+def test_windows_fill_exactly():
+    """音频块恰好填满窗口时不产生空的剩余窗口"""
+    chunks = [np.ones(SAMPLE_RATE, dtype=np.float32) for _ in range(4)]
+    app = make_app(2, chunks)
+
+    app._process_audio_loop()
+
+    assert [len(window) for window in app.windows] == [2 * SAMPLE_RATE, 2 * SAMPLE_RATE]
+
+
+def test_quiet_windows_recognized_when_gate_disabled():
+    """energy_threshold为0（默认）时低能量窗口同样识别"""
+    chunks = [np.full(3 * SAMPLE_RATE, 1e-4, dtype=np.float32)]
+    app = make_app(2, chunks)
+
+    app._process_audio_loop()
+
+    assert len(app.windows) == 2
+
+
+def test_silent_windows_skipped_when_gate_enabled():
+    """启用静音检测时只跳过能量低于阈值的窗口"""
+    chunks = [np.zeros(2 * SAMPLE_RATE, dtype=np.float32),
+              np.full(2 * SAMPLE_RATE, 0.1, dtype=np.float32),
+              np.zeros(SAMPLE_RATE, dtype=np.float32)]
+    app = make_app(2, chunks, energy_threshold=0.01)
+
+    app._process_audio_loop()
+
+    assert len(app.windows) == 1
+    assert float(app.windows[0][0]) == pytest.approx(0.1)
+
+
+@pytest.mark.parametrize("value", ["0", "-5"])
+def test_load_config_rejects_non_positive_segment(monkeypatch, value):
+    """ASR_MAX_SEGMENT_SEC不大于0时拒绝加载"""
+    monkeypatch.setenv("ASR_MAX_SEGMENT_SEC", value)
+    load_config.cache_clear()
+    try:
+        with pytest.raises(ValueError):
+            load_config()
+    finally:
+        load_config.cache_clear()
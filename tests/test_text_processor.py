@@ -0,0 +1,74 @@
+"""
+文本处理测试
+验证向量化前的中文数字转换、约数和常用词不被误改，以及归一化后为空的块被丢弃
+"""
+
+import pytest
+
+pytest.importorskip("soundmem.core.text_processor")
+
+from soundmem.core.text_processor import EMPTY_SENTINEL, TextProcessor, _cn_to_int
+
+
+@pytest.fixture
+def processor():
+    return TextProcessor()
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("十五", 15),
+    ("一百零五", 105),
+    ("两万三千", 23000),
+    ("一万二", 12000),
+    ("三千五", 3500),
+    ("两百五", 250),
+])
+def test_cn_to_int(word, expected):
+    """带单位的读法解析为整数，省略末位单位时按上一级单位补齐"""
+    assert _cn_to_int(word) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("一万二", "12000"),
+    ("三千五", "3500"),
+    ("两百五", "250"),
+    ("一百零五", "105"),
+    ("二零二四年", "2024年"),
+    ("十五", "15"),
+])
+def test_cn_numbers_converted(processor, text, expected):
+    """中文数字串转为阿拉伯数字"""
+    assert processor.normalize_for_embedding(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    # 约数和叠词
+    "两三个人",
+    "五六天",
+    "七八个",
+    "一一对应",
+    "三四十岁",
+    # 含数字的常用词
+    "万一下雨",
+    "一个",
+    "十分重要",
+    # "那个"后面没有停顿时不是填充词
+    "那个人",
+])
+def test_words_left_unchanged(processor, text):
+    """约数、叠词和含数字的常用词保持原样"""
+    assert processor.normalize_for_embedding(text) == text
+
+
+def test_fillers_removed(processor):
+    """口语填充词只在向量化文本中去除"""
+    assert processor.normalize_for_embedding("嗯，那个，今天开会") == "今天开会"
+    assert processor.normalize_for_embedding("嗯。") == EMPTY_SENTINEL
+
+
+def test_chunk_text_drops_empty_chunks(processor):
+    """归一化后只剩占位符的块不入库，其余块保留原文"""
+    assert processor.chunk_text("嗯。", timestamp="t") == []
+
+    chunks = processor.chunk_text("嗯，那个，今天开会", timestamp="t")
+    assert chunks == [{"text": "嗯，那个，今天开会", "timestamp": "t", "embedding_text": "今天开会"}]
@@ -0,0 +1,208 @@
+"""
+向量数据库测试
+使用按字符统计的假编码器，只依赖faiss和numpy，验证检索、重新打开、崩溃修复和量化切换
+"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+vector_store = pytest.importorskip("soundmem.core.vector_store")
+faiss = pytest.importorskip("faiss")
+
+DIM = 64
+
+
+class FakeEncoder:
+    """按字符码位统计的词袋向量，包含相同字符越多的文本越相似"""
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % DIM] += 1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.maximum(norms, 1e-12)
+        return vectors
+
+
+def open_store(path, **kwargs):
+    """打开（或重新打开）指定目录下的向量库"""
+    store = vector_store.VectorStore(db_path=str(path), flush_interval=60, **kwargs)
+    store.embedding_model = FakeEncoder()
+    store.initialize()
+    return store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = open_store(tmp_path)
+    yield store
+    store.close()
+
+
+def test_add_search_and_filter(store):
+    """检索返回最相似的文本，过滤条件按元数据等值匹配"""
+    store.add_texts(
+        ["今天上午讨论了火车时刻表", "下午的会议讨论苹果和香蕉的价格", "晚上坐火车回家"],
+        [{"speaker": "a"}, {"speaker": "b"}, {"speaker": "b"}]
+    )
+
+    results = store.search("苹果香蕉", top_k=1)
+    assert [r["text"] for r in results] == ["下午的会议讨论苹果和香蕉的价格"]
+
+    results = store.search("火车", top_k=3, filter_dict={"speaker": "b"})
+    assert {r["metadata"]["speaker"] for r in results} == {"b"}
+    assert results[0]["text"] == "晚上坐火车回家"
+
+
+def test_reopen_keeps_documents(tmp_path):
+    """关闭后重新打开，文档、元数据和索引保持一致"""
+    store = open_store(tmp_path)
+    ids = store.add_texts(["第一条记录", "第二条记录"], [{"n": 1}, {"n": 2}])
+    store.close()
+
+    store = open_store(tmp_path)
+    try:
+        assert store.get_count() == 2
+        assert store.ids == ids
+        assert store.index.ntotal == 2
+        assert store.search("第二条", top_k=1)[0]["metadata"] == {"n": 2}
+    finally:
+        store.close()
+
+
+def test_index_saved_on_interval_and_close(tmp_path, monkeypatch):
+    """写入时不逐批落盘索引，间隔到达或关闭时写入"""
+    store = open_store(tmp_path)
+    index_path = store._index_path
+    store.add_texts(["第一条记录"])
+    store._maybe_save_index()
+    assert not index_path.exists()
+
+    monkeypatch.setattr(vector_store, "INDEX_SAVE_INTERVAL", 0.0)
+    store._maybe_save_index()
+    assert faiss.read_index(str(index_path)).ntotal == 1
+
+    store.add_texts(["第二条记录"])
+    monkeypatch.setattr(vector_store, "INDEX_SAVE_INTERVAL", 3600.0)
+    store.close()
+    assert faiss.read_index(str(index_path)).ntotal == 2
+
+
+def test_sidecar_ahead_of_index_is_trimmed(tmp_path):
+    """旁路表比索引多的记录（索引未落盘）在打开时丢弃"""
+    store = open_store(tmp_path)
+    store.add_texts(["第一条记录", "第二条记录"])
+    meta_path = store._meta_path
+    store.close()
+
+    with sqlite3.connect(str(meta_path)) as conn:
+        conn.execute("INSERT INTO docs (pos, id, text, metadata) VALUES (2, 'orphan', '未入索引', '{}')")
+
+    store = open_store(tmp_path)
+    try:
+        assert store.get_count() == 2
+        assert store.index.ntotal == 2
+        assert "未入索引" not in store.docs
+    finally:
+        store.close()
+
+    with sqlite3.connect(str(meta_path)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0] == 2
+
+
+def test_index_ahead_of_sidecar_is_rebuilt(tmp_path):
+    """索引比旁路表多的向量（旁路表未提交）在打开时按旁路表重建索引"""
+    store = open_store(tmp_path)
+    store.add_texts(["苹果香蕉", "火车飞机", "汽车轮船"])
+    meta_path = store._meta_path
+    store.close()
+
+    with sqlite3.connect(str(meta_path)) as conn:
+        conn.execute("DELETE FROM docs WHERE pos = 2")
+
+    store = open_store(tmp_path)
+    try:
+        assert store.get_count() == 2
+        assert store.index.ntotal == 2
+        assert store.search("火车飞机", top_k=1)[0]["text"] == "火车飞机"
+    finally:
+        store.close()
+
+
+def test_switches_to_sq8_after_training_size(tmp_path, monkeypatch):
+    """向量数达到SQ_TRAIN_SIZE后切换为int8量化索引，位置与旁路表保持一致"""
+    monkeypatch.setattr(vector_store, "SQ_TRAIN_SIZE", 50)
+    texts = [f"记录{i}号" + "甲乙丙丁戊己庚辛"[i % 8] * (i % 5 + 1) for i in range(60)]
+
+    store = open_store(tmp_path)
+    store.add_texts(texts[:40])
+    assert isinstance(store.index, faiss.IndexHNSWFlat)
+
+    store.add_texts(texts[40:])
+    assert isinstance(store.index, faiss.IndexHNSWSQ)
+    assert store.index.ntotal == store.get_count() == 60
+    assert store.search(texts[55], top_k=1)[0]["text"] == texts[55]
+    store.close()
+
+    store = open_store(tmp_path)
+    try:
+        assert isinstance(store.index, faiss.IndexHNSWSQ)
+        assert store.get_count() == 60
+    finally:
+        store.close()
+
+
+def test_quantization_disabled_keeps_fp32(tmp_path, monkeypatch):
+    """quantization="none"时始终使用FP32索引"""
+    monkeypatch.setattr(vector_store, "SQ_TRAIN_SIZE", 10)
+    store = open_store(tmp_path, quantization="none")
+    try:
+        store.add_texts([f"记录{i}" for i in range(20)])
+        assert isinstance(store.index, faiss.IndexHNSWFlat)
+    finally:
+        store.close()
+
+
+def test_vectors_added_during_quantization_are_kept(tmp_path, monkeypatch):
+    """量化重建在锁外进行，期间写入的向量在切换时按顺序补上"""
+    monkeypatch.setattr(vector_store, "SQ_TRAIN_SIZE", 50)
+    store = open_store(tmp_path)
+    new_index = store._new_index
+
+    def new_index_with_concurrent_write(dim, train_vectors=None):
+        index = new_index(dim, train_vectors)
+        if train_vectors is not None:
+            store.add_texts(["记录49号"])
+        return index
+
+    monkeypatch.setattr(store, "_new_index", new_index_with_concurrent_write)
+    try:
+        store.add_texts([f"记录{i}号" for i in range(50)])
+        assert isinstance(store.index, faiss.IndexHNSWSQ)
+        assert store.index.ntotal == store.get_count() == 51
+        assert store.docs[50] == "记录49号"
+        expected = FakeEncoder().encode(["记录49号"])[0]
+        np.testing.assert_allclose(store.index.reconstruct(50), expected, atol=0.02)
+    finally:
+        store.close()
+
+
+def test_failed_flush_requeues_texts(tmp_path):
+    """初始化前写入失败的文本放回队列，初始化后按原顺序写入"""
+    store = vector_store.VectorStore(db_path=str(tmp_path), flush_interval=60)
+    store.embedding_model = FakeEncoder()
+    store.enqueue_texts(["第一条记录"], [{"n": 1}])
+    assert store.flush() == []
+
+    store.enqueue_texts(["第二条记录"], [{"n": 2}])
+    store.initialize()
+    try:
+        assert len(store.flush()) == 2
+        assert store.docs == ["第一条记录", "第二条记录"]
+        assert [meta["n"] for meta in store.metas] == [1, 2]
+    finally:
+        store.close()